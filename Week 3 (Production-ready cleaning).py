@@ -1,6 +1,9 @@
 import pandas as pd
 import numpy as np
 import time
+from dataclasses import dataclass, field
+
+from pipeline_utils import df_shrink, most_frequent
 
 # ==========================================
 # PART 1: OUTLIER STRATEGIES (Day 11)
@@ -11,9 +14,11 @@ import time
 # Simply removing them can shift means and decision boundaries. [cite: 35]
 # Use "Capping" (Winsorization) to limit their influence without losing the record. [cite: 47, 48]
 
+# Standalone helper for one-off Series. production_pipeline applies the same 1%/99% capping,
+# but with cut-offs learned once by PipelineStats so batches and chunks share them.
 def winsorize_series(s: pd.Series, lower_q=0.01, upper_q=0.99) -> pd.Series:
-    """Cap values at percentiles. Ideal for heavy-tailed data.""" [cite: 53, 54]
-    lower, upper = s.quantile(lower_q), s.quantile(upper_q)
+    """Cap values at percentiles. Ideal for heavy-tailed data."""  # [cite: 53, 54]
+    lower, upper = s.quantile([lower_q, upper_q]).to_numpy() # One selection pass for both cut-offs
     return s.clip(lower=lower, upper=upper) # Limits leverage on loss functions. [cite: 46]
 
 # ==========================================
@@ -24,10 +29,18 @@ def winsorize_series(s: pd.Series, lower_q=0.01, upper_q=0.99) -> pd.Series:
 # Inconsistent text (case, whitespace) creates "spurious categories" that confuse models. [cite: 154]
 # Naive datetime handling is risky; always standardize to a common timezone (UTC). [cite: 144, 145]
 
+# Arrow-backed strings run every .str step in C; plain 'string' if pyarrow is missing.
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
 def clean_text_and_dates(df: pd.DataFrame) -> pd.DataFrame:
     if 'city' in df.columns:
         # Step: Normalization Flow -> Raw -> Lower -> Remove Punctuation -> Canonical [cite: 169]
-        df['city'] = (df['city']
+        # Patterns stay plain strings: a compiled re.Pattern forces pandas off the Arrow kernels.
+        df['city'] = (df['city'].astype(STRING_DTYPE)
                       .str.strip().str.lower()
                       .str.replace(r"[^a-z\s]", "", regex=True) # Remove special characters [cite: 168]
                       .str.replace(r"\s+", " ", regex=True)) # Collapse whitespace [cite: 169]
@@ -59,20 +72,64 @@ def clean_text_and_dates(df: pd.DataFrame) -> pd.DataFrame:
 # Order of operations matters: 1. Types -> 2. Missing -> 3. Outliers -> 4. Strings. [cite: 185]
 # Outlier detection on wrong data types is meaningless. [cite: 185]
 
-def production_pipeline(df_raw: pd.DataFrame) -> pd.DataFrame:
-    """Function-based modular design for reproducibility.""" [cite: 183, 184]
-    df = df_raw.copy()
+def _to_float_array(s: pd.Series) -> np.ndarray:
+    """Force numeric (bad values -> NaN) into a fresh float64 array we are free to modify."""
+    return pd.to_numeric(s, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+
+@dataclass
+class PipelineStats:
+    """Statistics learned once with fit() and reused for every batch or chunk (fit/transform split)."""
+    medians: dict = field(default_factory=dict)
+    q01: dict = field(default_factory=dict)
+    q99: dict = field(default_factory=dict)
+    modes: dict = field(default_factory=dict)
+
+    @classmethod
+    def fit(cls, df: pd.DataFrame, numeric_cols=('income',), text_cols=()) -> "PipelineStats":
+        stats = cls()
+        for col in numeric_cols:
+            stats.fit_numeric(col, _to_float_array(df[col]))
+        for col in text_cols:
+            stats.modes[col] = most_frequent(df[col])
+        return stats
+
+    def fit_numeric(self, col, values: np.ndarray) -> None:
+        """Learn median and caps for one column; values (float64, NaN = missing) is overwritten."""
+        if values.size == 0:
+            # Nothing to learn from: NaN stats, like pandas median()/quantile() on an empty column
+            self.medians[col] = self.q01[col] = self.q99[col] = np.nan
+            return
+        self.medians[col] = np.nanmedian(values)
+        # Caps are taken after imputation, exactly like the in-memory pipeline
+        np.copyto(values, self.medians[col], where=np.isnan(values))
+        self.q01[col], self.q99[col] = np.quantile(values, [0.01, 0.99], overwrite_input=True)
+
+def production_pipeline(df_raw: pd.DataFrame, stats: PipelineStats = None) -> pd.DataFrame:
+    """Function-based modular design for reproducibility."""  # [cite: 183, 184]
+    # No stats given: learn them from this frame (same result as before the fit/transform split)
+    if stats is None:
+        stats = PipelineStats.fit(df_raw)
 
-    # 1. Type Normalization: Force numeric before math operations. [cite: 185]
-    df['income'] = pd.to_numeric(df['income'], errors='coerce')
+    # Shallow copy is enough: columns are replaced, never written into
+    df = df_raw.copy(deep=False)
 
-    # 2. Imputation: Fill gaps with Median (robust to outliers). [cite: 194]
-    # Add indicators to let the model know data was guessed. [cite: 194]
-    df['income_missing'] = df['income'].isna().astype(int)
-    df['income'] = df['income'].fillna(df['income'].median())
+    for col, median in stats.medians.items():
+        # 1. Type Normalization: Force numeric before math operations. [cite: 185]
+        values = _to_float_array(df[col])
 
-    # 3. Handle Outliers: Cap at 99th percentile. [cite: 194]
-    df['income'] = winsorize_series(df['income'], upper_q=0.99)
+        # 2. Imputation: Fill gaps with Median (robust to outliers). [cite: 194]
+        # Add indicators to let the model know data was guessed. [cite: 194]
+        missing = np.isnan(values)
+        np.copyto(values, median, where=missing)
+
+        # 3. Handle Outliers: Cap at 1st/99th percentile (winsorization). [cite: 194]
+        # Work on the array and write each column back exactly once.
+        np.clip(values, stats.q01[col], stats.q99[col], out=values)
+        df[col] = values
+        df[f'{col}_missing'] = missing.view(np.uint8)  # 1 byte per flag, no copy of the mask
+
+    for col, mode in stats.modes.items():
+        df[col] = df[col].fillna(mode)
 
     # 4. Clean Strings/Dates
     df = clean_text_and_dates(df)
@@ -82,22 +139,117 @@ def production_pipeline(df_raw: pd.DataFrame) -> pd.DataFrame:
     
     return df
 
+def production_pipeline_polars(df_raw: pd.DataFrame, stats: PipelineStats = None) -> pd.DataFrame:
+    """Same steps as production_pipeline, run as one multithreaded Polars query.
+
+    Pandas in, pandas out (same input dtypes accepted); needs the optional polars package.
+    """
+    import polars as pl
+
+    if stats is None:
+        stats = PipelineStats.fit(df_raw)
+
+    # 1. Type Normalization stays in pandas: mixed object columns can't enter Arrow as-is
+    df = df_raw.copy(deep=False)
+    for col in stats.medians:
+        df[col] = _to_float_array(df[col])
+    pdf = pl.from_pandas(df)
+
+    exprs = []
+    for col, median in stats.medians.items():
+        values = pl.col(col).fill_nan(None)  # NaN and null both count as missing
+        exprs.append(values.fill_null(median).clip(stats.q01[col], stats.q99[col]).alias(col))
+        exprs.append(values.is_null().cast(pl.UInt8).alias(f'{col}_missing'))
+    for col, mode in stats.modes.items():
+        exprs.append(pl.col(col).fill_null(mode))
+
+    if 'city' in pdf.columns:
+        # Cast first so categorical input works like in clean_text_and_dates
+        exprs.append(pl.col('city').cast(pl.String)
+                     .str.strip_chars().str.to_lowercase()
+                     .str.replace_all(r"[^a-z\s]", "")
+                     .str.replace_all(r"\s+", " "))
+
+    if 'signup_time' in pdf.columns:
+        signup = pl.col('signup_time')
+        dtype = pdf.schema['signup_time']
+        if dtype == pl.String:
+            # Like pandas: format inferred from the data, unparseable values -> null
+            signup = signup.str.to_datetime(strict=False)
+        if isinstance(dtype, pl.Datetime) and dtype.time_zone is not None:
+            signup = signup.dt.convert_time_zone("UTC")
+        else:
+            signup = signup.dt.replace_time_zone("UTC")
+        exprs.append(signup)
+
+    out = pdf.lazy().with_columns(exprs).collect().to_pandas()
+    out.index = df_raw.index  # Polars has no index; keep the caller's (e.g. later read_csv chunks)
+    if 'city' in out.columns:
+        out['city'] = out['city'].astype(STRING_DTYPE)
+    return out
+
+# Text columns are read as strings up front so chunks never disagree on inferred types.
+RAW_CSV_DTYPES = {'city': STRING_DTYPE, 'signup_time': STRING_DTYPE}
+
+def production_pipeline_chunks(path, chunksize=1_000_000, stats: PipelineStats = None):
+    """Stream a large CSV through the production pipeline, yielding one cleaned chunk at a time.
+
+    Without stats, pass 1 reads only 'income' to fit global ones, so every chunk
+    gets the same numbers production_pipeline would compute on the whole file.
+    Exact medians need every value, so that pass holds one float64 column (O(N));
+    pass 2 only ever holds one chunk.
+    """
+    # Pass 1: global statistics from a single column, filled into one preallocated buffer
+    if stats is None:
+        n_rows = sum(len(chunk) for chunk in pd.read_csv(path, usecols=['income'], chunksize=chunksize))
+        income = np.empty(n_rows, dtype=np.float64)
+        start = 0
+        for chunk in pd.read_csv(path, usecols=['income'], chunksize=chunksize):
+            income[start:start + len(chunk)] = _to_float_array(chunk['income'])
+            start += len(chunk)
+        stats = PipelineStats()
+        stats.fit_numeric('income', income)
+        del income
+
+    # Pass 2: every chunk reuses the same fitted scalars
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=RAW_CSV_DTYPES):
+        yield production_pipeline(chunk, stats)
+
+def write_chunks_to_parquet(chunks, out_path):
+    """Append cleaned chunks to one Parquet file; only one chunk is in memory at a time."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, table.schema)
+            else:
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
 # ==========================================
 # EXECUTION & LOGGING
 # ==========================================
 
 if __name__ == "__main__":
     # Simulate messy production data
+    # Typed arrays: every column is built with its final dtype (no list inference, no cast pass)
     data = {
-        'income': [50000, 60000, np.nan, 1e9], # Large outlier + Missing [cite: 31]
-        'city': [' New York ', 'nyc', 'NY', 'SF!'], # Unstandardized [cite: 158]
-        'signup_time': ['2024-01-01', '01/01/2024', 'invalid_date', '2024-05-01']
+        'income': np.array([50000, 60000, np.nan, 1e9], dtype=np.float64), # Large outlier + Missing [cite: 31]
+        'city': pd.array([' New York ', 'nyc', 'NY', 'SF!'], dtype=STRING_DTYPE), # Unstandardized [cite: 158]
+        'signup_time': pd.array(['2024-01-01', '01/01/2024', 'invalid_date', '2024-05-01'], dtype=STRING_DTYPE)
     }
     df_raw = pd.DataFrame(data)
 
     # Logging: Record counts and missingness summaries for audit trails. [cite: 187]
     start_time = time.perf_counter()
-    df_clean = production_pipeline(df_raw)
+    df_clean = df_shrink(production_pipeline(df_raw))
     duration = time.perf_counter() - start_time
 
     print(f"Pipeline finished in {duration:.4f}s. Rows: {len(df_clean)}")
@@ -5,6 +5,8 @@ from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 
+from pipeline_utils import df_shrink
+
 # ==========================================
 # PART 1: ADVANCED TOOLS (Week 1 & 3)
 # ==========================================
@@ -19,12 +21,18 @@ def log_pipeline_step(step_name, *args, **kwargs):
 # PART 2: PRODUCTION CLEANING (Week 2 & 3)
 # ==========================================
 
+MISSING_TOKENS = frozenset(["?", "N/A", "none"])
+
 
 
 def production_cleaner(df):
     """Handles missing values, types, and outliers."""
-    # 1. Standardize Missing Tokens
-    df = df.replace(["?", "N/A", "none"], np.nan)
+    # 1. Standardize Missing Tokens (text columns only; numbers can't hold them)
+    df = df.copy(deep=False)
+    for col in df.select_dtypes(include=['object', 'string', 'category']).columns:
+        is_missing = df[col].isin(MISSING_TOKENS)
+        if is_missing.any():
+            df[col] = df[col].mask(is_missing)
     
     # 2. Type Casting & Missing Values
     # Use Median for numbers (Robust) and Mode for text
@@ -33,9 +41,8 @@ def production_cleaner(df):
     
     # 3. Outlier Strategy: Capping (Winsorization)
     # Instead of deleting, we 'cap' extreme values at the 99th percentile
-    for col in num_cols:
-        upper_limit = df[col].quantile(0.99)
-        df[col] = df[col].clip(upper=upper_limit)
+    upper_limits = df[num_cols].quantile(0.99)
+    df[num_cols] = df[num_cols].clip(upper=upper_limits, axis=1)
         
     return df
 
@@ -43,42 +50,68 @@ def production_cleaner(df):
 # PART 3: FEATURE ENGINEERING (Week 4)
 # ==========================================
 
+AGE_BINS = np.array([0, 18, 65, 120])
+AGE_LABELS = ['Minor', 'Adult', 'Senior']
+
+
 
+# [Image of machine learning feature engineering process]
 
-[Image of machine learning feature engineering process]
 
+def engineer_features(df, allow_fp32=False):
+    """Transforms raw data into model-ready inputs.
 
-def engineer_features(df):
-    """Transforms raw data into model-ready inputs."""
+    allow_fp32=True stores float64 'spend' logs as float32 (half the memory traffic).
+    """
     
     # 1. Log Transformation (Handling Skewness)
     # Helps normalize data with long tails (like income or spend)
     if 'spend' in df.columns:
-        df['spend_log'] = np.log1p(df['spend'])
+        out_dtype = np.float32 if allow_fp32 and df['spend'].dtype == np.float64 else np.float64
+        spend = df['spend'].to_numpy(dtype=out_dtype, na_value=np.nan, copy=True)
+        np.log1p(spend, out=spend)  # in place: no second buffer
+        df['spend_log'] = spend
     
     # 2. Binning (Discretization)
     # Turning a continuous age into categories
+    # Same right-closed bins as pd.cut, but one searchsorted pass over the raw array
     if 'age' in df.columns:
-        df['age_group'] = pd.cut(df['age'], bins=[0, 18, 65, 120], labels=['Minor', 'Adult', 'Senior'])
+        age = df['age'].to_numpy(dtype=np.float64, na_value=np.nan)
+        codes = np.searchsorted(AGE_BINS, age, side='left') - 1
+        codes[(age <= AGE_BINS[0]) | (age > AGE_BINS[-1]) | np.isnan(age)] = -1  # -1 -> NaN
+        df['age_group'] = pd.Categorical.from_codes(codes, categories=AGE_LABELS, ordered=True)
         
     # 3. Encoding (One-Hot for Nominal, Codes for Ordinal)
-    # Convert 'membership' into numerical codes
+    # Keep 'membership' as a category; its integer codes are read on demand
     if 'membership' in df.columns:
-        df['membership_code'] = df['membership'].astype('category').cat.codes
+        if not isinstance(df['membership'].dtype, pd.CategoricalDtype):
+            df['membership'] = df['membership'].astype('category')
+        df['membership_code'] = df['membership'].cat.codes
         
     return df
 
+def one_hot_sparse(df, nominal_cols):
+    """One-Hot encode nominal columns into a sparse int8 matrix (CSR) plus the fitted encoder.
+
+    Only the 1s are stored, so high-cardinality columns don't blow up memory.
+    Most sklearn estimators accept the CSR matrix directly.
+    """
+    encoder = OneHotEncoder(sparse_output=True, dtype=np.int8, handle_unknown='ignore')
+    X_cat = encoder.fit_transform(df[nominal_cols])
+    return X_cat, encoder
+
 # ==========================================
 # PART 4: INTEGRATED EXECUTION
 # ==========================================
 
 if __name__ == "__main__":
     # Sample Dirty Data
+    # Typed arrays: every column is built with its final dtype (no list inference, no cast pass)
     raw_data = {
-        'age': [25, 30, np.nan, 150],
-        'spend': [100, 200, 50, 1000000], # Extreme Outlier
-        'membership': ['bronze', 'gold', 'silver', 'bronze'],
-        'city': ['NY', 'SF', 'NY', 'LA']
+        'age': np.array([25, 30, np.nan, 150], dtype=np.float32),
+        'spend': np.array([100, 200, 50, 1000000], dtype=np.int32), # Extreme Outlier
+        'membership': pd.Categorical(['bronze', 'gold', 'silver', 'bronze']),
+        'city': pd.Categorical(['NY', 'SF', 'NY', 'LA'])
     }
     df = pd.DataFrame(raw_data)
 
@@ -89,11 +122,15 @@ if __name__ == "__main__":
     df_cleaned = production_cleaner(df)
 
     # 3. Engineering (Week 4 Logic)
-    df_final = engineer_features(df_cleaned)
+    df_final = df_shrink(engineer_features(df_cleaned, allow_fp32=True))
 
     print("\n--- Final Model-Ready Data ---")
     print(df_final.head())
 
-    # 4. Save Metadata (Day 5 & 14 Skill)
+    # 4. Sparse One-Hot for Nominal Features
+    X_city, city_encoder = one_hot_sparse(df_final, ['city'])
+    print(f"\nOne-Hot 'city': shape={X_city.shape}, stored values={X_city.nnz}")
+
+    # 5. Save Metadata (Day 5 & 14 Skill)
     with open("pipeline_metadata.json", "w") as f:
         json.dump({"samples": len(df_final), "status": "Ready for Training"}, f)
@@ -0,0 +1,33 @@
+import pandas as pd
+import numpy as np
+
+# ==========================================
+# SHARED HELPERS (used by every week's script)
+# ==========================================
+
+def df_shrink(df, max_unique_ratio=0.5):
+    """Downcast numbers and turn low-cardinality text into 'category' to save memory."""
+    for col in df.select_dtypes(include=['integer']).columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    for col in df.select_dtypes(include=['float']).columns:
+        df[col] = pd.to_numeric(df[col], downcast='float')
+    for col in df.select_dtypes(include=['object', 'string']).columns:
+        if df[col].nunique(dropna=True) / max(len(df), 1) < max_unique_ratio:
+            df[col] = df[col].astype('category')
+    return df
+
+def most_frequent(s):
+    """Mode of a column; categoricals are counted on their integer codes (no value sort)."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = s.cat.codes.to_numpy()
+        codes = codes[codes >= 0]  # -1 marks NaN
+        return s.cat.categories[np.bincount(codes).argmax()] if len(codes) else np.nan
+    modes = s.mode()
+    return modes.iat[0] if len(modes) else np.nan
+
+def vmap(series, fn):
+    """Applies fn to every cell. Only for logic with no .str / NumPy equivalent (Day 3).
+
+    Loops over the raw array, skipping Series.apply's per-call dispatch and index handling.
+    """
+    return pd.Series([fn(x) for x in series.to_numpy()], index=series.index, name=series.name, dtype=object)